@@ -1,10 +1,44 @@
 import os
-import json
-import ast 
+import re
+import orjson
+import uuid
+import hashlib
 import requests 
+import threading
+import functools
 import concurrent.futures 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-from urllib.parse import quote_plus 
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session
+from flask.json.provider import DefaultJSONProvider
+
+SYSTEM_PROMPT = """
+You are 'Movie Bot', a cheerful and helpful movie recommendation assistant. 
+The user will tell you their mood or preferences. Your job is to:
+1.  Understand their mood.
+2.  Recommend 3-5 movies that benefits that mood.
+3.  Keep your replies conversational, friendly, and concise (like a chatbot).
+4.  Do not recommend new movies. movie should be before 2022.
+5.  **Crucially, you must ALWAYS respond with a JSON object in the following exact format:**
+{
+    "reply_to_user": "[Your friendly reply and recommendations go here]", 
+    "context": "[A very brief summary of the conversation so far, including the user's last message and your reply. This is for your own memory.]",
+    "recommended_movies":["movie1","movie2","movie3"](this should be python list)
+}
+"""
+
+# Structured-output schema matching the format above. With it, Gemini returns bare JSON,
+# so /chat no longer has to dig the object out of surrounding text.
+CHAT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "reply_to_user": {"type": "STRING"},
+        "context": {"type": "STRING"},
+        "recommended_movies": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["reply_to_user", "context", "recommended_movies"],
+}
 
 # --- Gemini Configuration ---
 try:
@@ -12,13 +46,51 @@ try:
     # NOTE: Using a hardcoded API key is generally unsafe.
     api_key=os.getenv("GEMINI_API_KEY")
     genai.configure(api_key=api_key) 
-    model = genai.GenerativeModel('gemini-2.5-flash') 
+    # The system prompt is sent as a system instruction so every call shares the same
+    # prompt prefix, which the provider can cache, instead of being pasted into each message.
+    model = genai.GenerativeModel(
+        'gemini-2.5-flash',
+        system_instruction=SYSTEM_PROMPT,
+        generation_config={"response_mime_type": "application/json", "response_schema": CHAT_RESPONSE_SCHEMA},
+    )
     print("Gemini model loaded successfully.")
 except Exception as e:
     print(f"Error loading Gemini model: {e}")
     model = None
 
+# --- Redis Configuration ---
+# Optional cache shared by all workers, placed in front of the external APIs.
+# Without REDIS_URL only the in-process caches below are used.
+REDIS_URL = os.getenv("REDIS_URL")
+# Seconds; kept well below the upstream API timeouts so a stalled Redis fails fast
+REDIS_TIMEOUT = 0.5
+redis_client = None
+if REDIS_URL:
+    try:
+        import redis
+        redis_client = redis.Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=REDIS_TIMEOUT,
+            socket_timeout=REDIS_TIMEOUT,
+        )
+        redis_client.ping()
+        print("Redis cache connected successfully.")
+    except Exception as e:
+        print(f"Error connecting to Redis cache: {e}")
+        redis_client = None
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, used by jsonify() and request.json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.secret_key = 'super_secret_key_for_session_management_4920492'
 
 # --- API Endpoints and Keys ---
@@ -31,32 +103,169 @@ RECOMMENDATION_API_URL = "https://recommendor-api-2.onrender.com/recommend"
 # The similarity API base URL
 SIMILARITY_API_BASE = "https://recommendor-api-2.onrender.com/check_similarity"
 
-SYSTEM_PROMPT = """
-You are 'Movie Bot', a cheerful and helpful movie recommendation assistant. 
-The user will tell you their mood or preferences. Your job is to:
-1.  Understand their mood.
-2.  Recommend 3-5 movies that benefits that mood.
-3.  Keep your replies conversational, friendly, and concise (like a chatbot).
-4.  Do not recommend new movies. movie should be before 2022.
-5.  **Crucially, you must ALWAYS respond with a JSON object in the following exact format:**
-{
-    "reply_to_user": "[Your friendly reply and recommendations go here]", 
-    "context": "[A very brief summary of the conversation so far, including the user's last message and your reply. This is for your own memory.]",
-    "recommended_movies":["movie1","movie2","movie3"](this should be python list)
-}
-"""
+# --- Outbound HTTP ---
+# One pooled session for all external APIs so keep-alive connections (and their
+# TLS handshakes) are reused across requests. Read timeouts are not retried, so a
+# hung upstream costs at most one read timeout.
+HTTP_SESSION = requests.Session()
+HTTP_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, read=False, backoff_factor=0.3),
+))
+# (connect, read) timeout in seconds
+REQUEST_TIMEOUT = (3.05, 10)
+
+# Process-wide pool for the /chat poster lookups, so threads are reused across requests
+# instead of a new pool being started and torn down on every chat message.
+VISUAL_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="visual-rec")
+# Upper bound on lookups one chat reply keeps in flight, so a long list cannot take over the pool
+MAX_VISUAL_LOOKUPS_IN_FLIGHT = 5
+
+# --- Local Title Index ---
+# Lowercased title -> {"imdb_id", "title", "poster_path"} for chat recommendations, so titles
+# we already know skip the search API. Seeded from TITLE_INDEX_PATH (a JSON object of
+# title -> movie) when present, and backfilled at runtime with search results whose
+# title matches exactly (fuzzy matches are left to the TTL-bound TITLE_SEARCH_CACHE).
+TITLE_INDEX_PATH = os.getenv("TITLE_INDEX_PATH", "titles_index.json")
+TITLE_INDEX_MAX_SIZE = 50000
+TITLE_INDEX = {}
+if os.path.exists(TITLE_INDEX_PATH):
+    try:
+        with open(TITLE_INDEX_PATH, "rb") as f:
+            loaded_index = orjson.loads(f.read())
+        if not isinstance(loaded_index, dict):
+            raise ValueError("expected a JSON object of title -> movie")
+        for title, movie in loaded_index.items():
+            if isinstance(movie, dict) and movie.get("imdb_id"):
+                TITLE_INDEX[title.strip().lower()] = movie
+            else:
+                print(f"Skipping title index entry for '{title}': expected a movie object with an imdb_id")
+        print(f"Loaded {len(TITLE_INDEX)} titles into the local title index.")
+    except (OSError, ValueError) as e:
+        print(f"Error loading title index from {TITLE_INDEX_PATH}: {e}")
+
+# --- Response Caches ---
+# Upstream data changes on human timescales, so repeat lookups are served from memory.
+# The TTL bounds staleness. Access goes through _single_flight, which holds the lock.
+RECOMMENDATION_CACHE = TTLCache(maxsize=2048, ttl=3600)
+OVERVIEW_CACHE = TTLCache(maxsize=4096, ttl=600)
+TITLE_SEARCH_CACHE = TTLCache(maxsize=4096, ttl=600)
+STREAMING_CACHE = TTLCache(maxsize=2048, ttl=3600)
+SIMILARITY_CACHE = TTLCache(maxsize=4096, ttl=3600)
+
+# Redis TTLs (seconds) for the shared cache layer
+OVERVIEW_REDIS_TTL = 6 * 60 * 60
+STREAMING_REDIS_TTL = 24 * 60 * 60
+RECOMMENDATION_REDIS_TTL = 24 * 60 * 60
+SIMILARITY_REDIS_TTL = 24 * 60 * 60
+SEARCH_RESULTS_REDIS_TTL = 30 * 60
+# Bump when the recommender model changes so stale recommendations are not served
+RECOMMENDATION_CACHE_VERSION = "v1"
+# Raw LLM replies keyed by the normalized chat turn, so common requests ("something funny")
+# skip the model entirely.
+CHAT_REPLY_CACHE = TTLCache(maxsize=1024, ttl=3600)
+CHAT_REPLY_CACHE_LOCK = threading.Lock()
+
 
 # --- UTILITY FUNCTIONS ---
 
+def _decode_json(response):
+    """
+    Decodes a JSON response body with orjson, which is considerably faster than response.json().
+    Invalid bodies raise requests' JSONDecodeError, so callers' RequestException handling still applies.
+    """
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        raise requests.exceptions.JSONDecodeError(e.msg, e.doc, e.pos) from e
+
+def _redis_cached(prefix, ttl):
+    """
+    Decorator for single-argument lookups. Non-None results are stored in Redis under
+    "<prefix>:<key>" for `ttl` seconds (tuple keys are joined with ":"). If Redis is not
+    configured this does nothing. If Redis errors, the wrapped function is called directly.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(key):
+            if redis_client is None:
+                return func(key)
+
+            key_parts = key if isinstance(key, tuple) else (key,)
+            cache_key = ":".join((prefix, *key_parts))
+            try:
+                cached = redis_client.get(cache_key)
+                if cached is not None:
+                    return orjson.loads(cached)
+            except redis.RedisError as e:
+                print(f"Redis read error for {cache_key}: {e}")
+
+            result = func(key)
+            if result is not None:
+                try:
+                    redis_client.setex(cache_key, ttl, orjson.dumps(result))
+                except redis.RedisError as e:
+                    print(f"Redis write error for {cache_key}: {e}")
+            return result
+
+        return wrapper
+    return decorator
+
+def _single_flight(cache):
+    """
+    Decorator for single-argument lookups. Results are served from `cache`, and
+    concurrent calls with the same key share one in-flight call instead of each
+    hitting the upstream API. None results (failures) are not cached.
+    """
+    def decorator(func):
+        lock = threading.Lock()
+        in_flight = {}
+
+        @functools.wraps(func)
+        def wrapper(key):
+            with lock:
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached
+                future = in_flight.get(key)
+                is_owner = future is None
+                if is_owner:
+                    future = concurrent.futures.Future()
+                    in_flight[key] = future
+
+            if not is_owner:
+                return future.result()
+
+            try:
+                result = func(key)
+            except Exception as e:
+                with lock:
+                    in_flight.pop(key, None)
+                future.set_exception(e)
+                raise
+
+            with lock:
+                if result is not None:
+                    cache[key] = result
+                in_flight.pop(key, None)
+            future.set_result(result)
+            return result
+
+        return wrapper
+    return decorator
+
+@_single_flight(STREAMING_CACHE)
+@_redis_cached("streaming", STREAMING_REDIS_TTL)
 def get_streaming_links(imdb_id):
     """Fetches streaming links using the Watchmode API."""
     api_url = f"https://api.watchmode.com/v1/title/{imdb_id}/sources/"
     params = {"apiKey": WATCHMODE_API_KEY}
     
     try:
-        response = requests.get(api_url, params=params)
+        response = HTTP_SESSION.get(api_url, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = _decode_json(response)
         
         if not data:
             return None
@@ -74,12 +283,17 @@ def get_streaming_links(imdb_id):
         print(f"Watchmode API Error for {imdb_id}: {e}")
         return None
 
+def _parse_cast(casts_string):
+    """Splits a comma-separated cast string into a list of clean actor names."""
+    cleaned_string = (casts_string or "").replace('\xa0', ' ').replace('\u00a0', ' ')
+    return [c.strip() for c in cleaned_string.split(',') if c.strip()]
+
 def _search_movies_utility(query):
     """Utility function to search the movie catalog."""
     try:
-        response = requests.get(SEARCH_API_URL, params={"title": query})
+        response = HTTP_SESSION.get(SEARCH_API_URL, params={"title": query}, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = _decode_json(response)
         
         results = []
         for movie in data:
@@ -89,7 +303,8 @@ def _search_movies_utility(query):
                 "poster_path": movie.get("poster_path"),
                 "release_year": "N/A", 
                 "overview": "Overview temporarily unavailable. Click 'View Details' for more information.",
-                "cast": movie.get("cast", "Actor 1, Actor 2") 
+                # Parsed once here so the details page can use the list as-is
+                "cast": _parse_cast(movie.get("cast", "Actor 1, Actor 2"))
             })
         return results
 
@@ -97,6 +312,8 @@ def _search_movies_utility(query):
         print(f"Error fetching catalog search results in utility: {e}")
         return []
 
+@_single_flight(OVERVIEW_CACHE)
+@_redis_cached("overview", OVERVIEW_REDIS_TTL)
 def _get_movie_details_utility(imdb_id):
     """Utility function to fetch detailed info (overview, rank, full cast)."""
     if not imdb_id or not imdb_id.startswith("tt"):
@@ -105,18 +322,15 @@ def _get_movie_details_utility(imdb_id):
     movie_data = {}
     
     try:
-        overview_response = requests.get(OVERVIEW_API_URL, params={"imdb_id": imdb_id}, timeout=10)
+        overview_response = HTTP_SESSION.get(OVERVIEW_API_URL, params={"imdb_id": imdb_id}, timeout=REQUEST_TIMEOUT)
         overview_response.raise_for_status()
-        data = overview_response.json()
+        data = _decode_json(overview_response)
         
         if "overview" in data:
             data["description"] = data.pop("overview")
 
         if "cast" in data and isinstance(data["cast"], str):
-            casts_string = data.pop("cast")
-            cleaned_string = casts_string.replace('\xa0', ' ').replace('\u00a0', ' ')
-            cast_list = [c.strip() for c in cleaned_string.split(',') if c.strip()]
-            data["cast"] = cast_list 
+            data["cast"] = _parse_cast(data.pop("cast"))
             
         movie_data.update(data)
         
@@ -139,12 +353,13 @@ def _get_movie_details_utility(imdb_id):
         return None
 
 
+@_single_flight(TITLE_SEARCH_CACHE)
 def _search_and_extract_movie(movie_name):
     """Searches for a single movie name and returns the required details for the recommendation card."""
     try:
-        response = requests.get(SEARCH_API_URL, params={"title": quote_plus(movie_name), "limit": 1})
+        response = HTTP_SESSION.get(SEARCH_API_URL, params={"title": movie_name, "limit": 1}, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = _decode_json(response)
         
         if data and data[0].get("imdb_id"):
             return {
@@ -158,24 +373,123 @@ def _search_and_extract_movie(movie_name):
         print(f"Error fetching search results for visual recommendation '{movie_name}': {e}")
         return None
 
+@_single_flight(RECOMMENDATION_CACHE)
+@_redis_cached(f"recs:{RECOMMENDATION_CACHE_VERSION}", RECOMMENDATION_REDIS_TTL)
+def _get_recommendations_utility(imdb_id):
+    """Utility function to fetch recommendations for a movie, with poster URLs made absolute. Results are cached per IMDb ID."""
+    try:
+        response = HTTP_SESSION.get(RECOMMENDATION_API_URL, params={"imdb_id": imdb_id}, timeout=(REQUEST_TIMEOUT[0], 15))
+        response.raise_for_status()
+        data = _decode_json(response)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching recommendations for {imdb_id}: {e}")
+        return None
+
+    formatted_recs = []
+    for rec in data.get("recommendations", []):
+        poster = rec.get("poster_path", "")
+        if poster and poster.startswith("/"):
+            rec["poster_path"] = f"https://image.tmdb.org/t/p/w500{poster}"
+        formatted_recs.append(rec)
+
+    return formatted_recs
+
+@_single_flight(SIMILARITY_CACHE)
+@_redis_cached("similarity", SIMILARITY_REDIS_TTL)
+def _get_similarity_utility(id_pair):
+    """
+    Utility function to fetch the similarity API response for an (id1, id2) pair.
+    Similarity is symmetric, so callers pass the pair sorted and both orders share a cache entry.
+    """
+    id1, id2 = id_pair
+    try:
+        # Note: Passing parameters in URL as the external API expects a GET request style
+        url = f"{SIMILARITY_API_BASE}?id1={id1}&id2={id2}"
+        response = HTTP_SESSION.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return _decode_json(response)
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching similarity for {id1}, {id2}: {e}")
+        return None
+
 def _fetch_visual_recommendations(movie_names):
     """Fetches visual data for a list of movie names in parallel."""
     if not movie_names or not isinstance(movie_names, list):
         return []
     
+    # The search API has no batch endpoint, so at least never search the same title twice
+    unique_names = {}
+    for name in movie_names:
+        if isinstance(name, str) and name.strip():
+            unique_names.setdefault(name.strip().lower(), name.strip())
+
+    names = list(unique_names.items())
+
+    # Only titles missing from the local index go to the search API, in batches
+    # of at most MAX_VISUAL_LOOKUPS_IN_FLIGHT concurrent lookups
+    unknown = [name for key, name in names if key not in TITLE_INDEX]
+    fetched = {}
+    for i in range(0, len(unknown), MAX_VISUAL_LOOKUPS_IN_FLIGHT):
+        batch = unknown[i:i + MAX_VISUAL_LOOKUPS_IN_FLIGHT]
+        fetched.update(zip(batch, VISUAL_EXECUTOR.map(_search_and_extract_movie, batch)))
+
     visual_recommendations = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(_search_and_extract_movie, name) for name in movie_names]
-        
-        for future in concurrent.futures.as_completed(futures):
-            movie_data = future.result()
-            if movie_data:
-                visual_recommendations.append(movie_data)
-                
+    for key, name in names:
+        movie_data = TITLE_INDEX.get(key)
+        if movie_data is None:
+            movie_data = fetched.get(name)
+            # Only pin exact title matches; a wrong fuzzy top hit must be able to expire
+            if (movie_data and (movie_data.get("title") or "").strip().lower() == key
+                    and len(TITLE_INDEX) < TITLE_INDEX_MAX_SIZE):
+                TITLE_INDEX[key] = movie_data
+        if movie_data:
+            visual_recommendations.append(movie_data)
+
     return visual_recommendations
 
 
+def _store_search_results(movies):
+    """
+    Remembers the basic info from the user's latest catalog search for the details page.
+    Stored server-side in Redis under a per-browser id when configured, so the session
+    cookie stays small; otherwise kept in the session itself.
+    """
+    if redis_client is None:
+        session['search_results'] = {movie['imdb_id']: movie for movie in movies}
+        return
+
+    session.pop('search_results', None)
+    sid = session.setdefault('sid', uuid.uuid4().hex)
+    try:
+        with redis_client.pipeline() as pipe:
+            for movie in movies:
+                pipe.setex(f"search:{sid}:{movie['imdb_id']}", SEARCH_RESULTS_REDIS_TTL, orjson.dumps(movie))
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"Redis write error for search results: {e}")
+
+def _get_search_result(imdb_id):
+    """Returns the stored search-result info for a movie, or an empty dict if unknown."""
+    if redis_client is None:
+        return session.get('search_results', {}).get(imdb_id, {})
+
+    sid = session.get('sid')
+    if not sid:
+        return {}
+    try:
+        cached = redis_client.get(f"search:{sid}:{imdb_id}")
+    except redis.RedisError as e:
+        print(f"Redis read error for search results: {e}")
+        return {}
+    return orjson.loads(cached) if cached else {}
+
+def _chat_cache_key(context, user_message):
+    """Builds a cache key for a chat turn, ignoring case, punctuation and extra whitespace."""
+    text = f"{context}\n{user_message}".lower()
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
 # --- BASE ROUTES ---
 
 @app.route("/")
@@ -208,17 +522,21 @@ def catalog_search_results():
         return redirect(url_for('catalog'))
     
     movies = _search_movies_utility(query) 
-    session['search_results'] = {movie['imdb_id']: movie for movie in movies}
+    _store_search_results(movies)
     
     return render_template('search_results.html', query=query, movies=movies)
 
 @app.route('/catalog/details/<movie_id>', methods=['GET'])
 def movie_details(movie_id):
-    # Check session for basic info
-    basic_movie_data = session.get('search_results', {}).get(movie_id, {})
+    # Check stored search results for basic info
+    basic_movie_data = _get_search_result(movie_id)
     
     detailed_data = _get_movie_details_utility(movie_id) 
-    cast_list=basic_movie_data.get('cast').replace('  ','').split(',')
+    cast_list = basic_movie_data.get('cast')
+    if isinstance(cast_list, str):
+        # Session cookies written before cast was parsed at search time still hold the raw string
+        cast_list = _parse_cast(cast_list)
+    cast_list = cast_list or ["Cast Unavailable"]
     if not detailed_data:
         detailed_data = {"rank": "Rank data unavailable (API failure).","description": "The detailed overview could not be fetched. The external API may be unreachable or returned an error.","cast": cast_list}
 
@@ -230,7 +548,7 @@ def movie_details(movie_id):
         "poster_url": basic_movie_data.get("poster_path") or detailed_data.get("poster_url", "https://placehold.co/350x500/2f3542/dfe4ea?text=Poster+Unavailable"),
         "rank": detailed_data.get("rank", "Rank data unavailable."),
         "description": detailed_data.get("description", "No detailed description found for this movie."),
-        "cast_members": basic_movie_data.get("cast", ["Cast Unavailable"]).replace('  ','').split(',') 
+        "cast_members": cast_list
     }
     
     return render_template('movie_details.html', movie=movie)
@@ -241,14 +559,17 @@ def movie_details(movie_id):
 def search_catalog():
     query = request.args.get("q", "").strip()
     limit = request.args.get("limit", 10, type=int) 
+    # Keep the value sent to the search API within a sane range
+    limit = max(1, min(limit, 50))
     
     if not query:
         return jsonify([])
 
     try:
-        response = requests.get(SEARCH_API_URL, params={"title": query})
+        # Let the search API truncate to the top `limit` matches instead of shipping the full list
+        response = HTTP_SESSION.get(SEARCH_API_URL, params={"title": query, "limit": limit}, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = _decode_json(response)
 
         results = []
         for movie in data[:limit]:
@@ -292,34 +613,20 @@ def get_recommendations():
                               recommendations=[],
                               error="Please select a movie from the search results first.")
     
-    try:
-        url = RECOMMENDATION_API_URL
-        response = requests.get(url, params={"imdb_id": movie_id}, timeout=15)
-        response.raise_for_status()
-        data = response.json()
-        
-        recommendations = data.get("recommendations", [])
-        
-        formatted_recs = []
-        for rec in recommendations:
-            poster = rec.get("poster_path", "")
-            if poster and poster.startswith("/"):
-                rec["poster_path"] = f"https://image.tmdb.org/t/p/w500{poster}"
-            formatted_recs.append(rec)
-
-        # Pass Data Directly to Template (No Session Storage as requested)
-        return render_template("recommendations_result.html",
-                              movie_name=movie_title,
-                              recommendations=formatted_recs,
-                              error=None)
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching recommendations: {e}")
+    formatted_recs = _get_recommendations_utility(movie_id)
+
+    if formatted_recs is None:
         return render_template("recommendations_result.html",
                               movie_name=movie_title,
                               recommendations=[],
                               error="Could not fetch recommendations from the external API.")
 
+    # Pass Data Directly to Template (No Session Storage as requested)
+    return render_template("recommendations_result.html",
+                          movie_name=movie_title,
+                          recommendations=formatted_recs,
+                          error=None)
+
 
 # --- SIMILARITY CHECKER (UPDATED PROXY) ---
 
@@ -335,31 +642,31 @@ def calculate_similarity():
     title1 = data.get("title1", "Movie 1")
     title2 = data.get("title2", "Movie 2")
 
+    if id1 and id2:
+        # Compare, sort and cache the ids as strings whatever type the client sent
+        id1, id2 = str(id1).strip(), str(id2).strip()
+
     if not id1 or not id2:
         return jsonify({"error": "Please select two movies."}), 400
 
-    try:
+    if id1 == id2:
+        # A movie is identical to itself; no need to ask the external API
+        api_data = {"cosine_similarity": 1.0}
+    else:
         # Call the external API server-side
-        # Note: Passing parameters in URL as the external API expects a GET request style
-        url = f"{SIMILARITY_API_BASE}?id1={id1}&id2={id2}"
-        
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        
-        api_data = response.json()
-        
-        # Return the whole response from external API + titles for the frontend
-        return jsonify({
-            "score_percent": api_data.get("cosine_similarity"), # Raw score, converted in JS
-            "cosine_similarity": api_data.get("cosine_similarity"),
-            "movie1_title": title1,
-            "movie2_title": title2
-        })
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error in /calculate_similarity proxy: {e}")
+        api_data = _get_similarity_utility(tuple(sorted((id1, id2))))
+
+    if api_data is None:
         return jsonify({"error": "Could not calculate similarity via external API."}), 500
 
+    # Return the whole response from external API + titles for the frontend
+    return jsonify({
+        "score_percent": api_data.get("cosine_similarity"), # Raw score, converted in JS
+        "cosine_similarity": api_data.get("cosine_similarity"),
+        "movie1_title": title1,
+        "movie2_title": title2
+    })
+
 
 # --- CHATBOT ROUTE ---
 
@@ -374,40 +681,51 @@ def chat():
         context = data.get("context", "")
 
         if not context:
-            prompt = f"{SYSTEM_PROMPT}\n\nUser: {user_message}"
+            prompt = f"User: {user_message}"
         else:
-            prompt = f"{SYSTEM_PROMPT}\n\nPrevious Context: {context}\n\nUser: {user_message}"
+            prompt = f"Previous Context: {context}\n\nUser: {user_message}"
 
-        # --- DIAGNOSTIC STEP 1: Check LLM Response ---
-        print(f"--- Calling LLM with prompt for user: {user_message[:50]}...")
-        
-        response = model.generate_content(prompt)
-        
-        response_text = response.text.strip()
-        print(f"--- RAW LLM Response Text: {response_text[:500]}...") # Print the raw output
-        
-        start_index = response_text.find('{')
-        end_index = response_text.rfind('}')
-        
-        if start_index == -1 or end_index == -1:
-            # This is correct handling for malformed JSON structure
-            raise json.JSONDecodeError("JSON delimiters not found or malformed.", response_text, 0)
+        cache_key = _chat_cache_key(context, user_message)
+        with CHAT_REPLY_CACHE_LOCK:
+            response_text = CHAT_REPLY_CACHE.get(cache_key)
+
+        if response_text is None:
+            # --- DIAGNOSTIC STEP 1: Check LLM Response ---
+            print(f"--- Calling LLM with prompt for user: {user_message[:50]}...")
+            
+            response = model.generate_content(prompt)
             
-        json_string = response_text[start_index:end_index+1].strip()
-        response_data = json.loads(json_string)
+            response_text = response.text.strip()
+            print(f"--- RAW LLM Response Text: {response_text[:500]}...") # Print the raw output
+
+            response_data = orjson.loads(response_text)
+
+            # Only fresh replies that parsed are stored; hits must not extend their own TTL
+            with CHAT_REPLY_CACHE_LOCK:
+                CHAT_REPLY_CACHE[cache_key] = response_text
+        else:
+            print(f"--- Serving cached LLM response for user: {user_message[:50]}...")
+            response_data = orjson.loads(response_text)
         
         recommended_movies = response_data.get("recommended_movies", [])
 
         # --- DIAGNOSTIC STEP 2: Check _fetch_visual_recommendations ---
         print(f"--- Recommended Movies found: {recommended_movies}")
-        
-        visual_recommendations = _fetch_visual_recommendations(recommended_movies) # Likely crash point
-        
-        response_data['visual_recommendations'] = visual_recommendations
-        
-        return jsonify(response_data)
 
-    except json.JSONDecodeError as e:
+        # Stream the reply as NDJSON: the text goes out as soon as the LLM is done,
+        # and the posters follow once the search lookups finish.
+        def generate():
+            yield orjson.dumps(response_data) + b"\n"
+            try:
+                visual_recommendations = _fetch_visual_recommendations(recommended_movies)
+            except Exception as e:
+                print(f"Error fetching visual recommendations: {type(e).__name__}: {e}")
+                visual_recommendations = []
+            yield orjson.dumps({"visual_recommendations": visual_recommendations}) + b"\n"
+
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    except orjson.JSONDecodeError as e:
         # This handles cases where the model returns invalid JSON syntax
         print(f"JSONDecodeError: {e} | Raw Text causing error: {response_text[:100]}")
         return jsonify({"reply_to_user": "Sorry, I got a little confused. Could you rephrase that?"}), 200